@@ -9,9 +9,22 @@ from net_devices.command import Command
 configuration = {
     'threading': {
         'max_threads': 128,
+        'max_connects': 8,
     },
     'default_credentials': {
         'username': None,
         'password': None
+    },
+    'ssh': {
+        'multiplex': False,
+        'control_path': '~/.ssh/cm-%r@%h:%p',
+        'control_persist': 600
+    },
+    'connection_pool': {
+        'enabled': True,
+        'max_size': 4,
+        'idle_timeout': 300,
+        'max_age': 3600,
+        'reap_interval': 30
     }
 }
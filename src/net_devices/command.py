@@ -4,7 +4,10 @@
 """
 
 from dataclasses import dataclass
-from typing import Optional
+from typing import ClassVar, Dict, Optional, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:
+    from net_devices.testbed import DeviceType
 
 
 @dataclass
@@ -37,6 +40,19 @@ class Command:
     command_ios_xe: Optional[str] = None
     command_nx_os: Optional[str] = None
 
+    # The attribute with the command for every OS type
+    attributes: ClassVar[Dict[str, str]] = {
+        'ios': 'command_ios',
+        'iosxr': 'command_ios_xr',
+        'iosxe': 'command_ios_xe',
+        'nxos': 'command_nx_os'
+    }
+
+    def __post_init__(self) -> None:
+        """ Set the commands for the different OS types once the
+            object is created """
+        self.set_commands()
+
     def set_commands(self) -> None:
         """ Method to set the commands for the different OS types. We
             fill in the commands that are None with the default
@@ -53,3 +69,21 @@ class Command:
 
         if self.command_nx_os is None:
             self.command_nx_os = self.command
+
+    def get(self, device_type: Union[str, 'DeviceType']) -> Optional[str]:
+        """
+            Method to get the command for a type of device.
+
+            Parameters
+            ----------
+            device_type : Union[str, DeviceType]
+                The type of device. Can be a DeviceType or the OS
+                string that Genie uses, like 'ios' or 'iosxr'.
+
+            Returns
+            -------
+            Optional[str]:
+                The command to send to this type of device
+        """
+        device_type = getattr(device_type, 'value', device_type)
+        return getattr(self, self.attributes[device_type])
@@ -39,7 +39,7 @@ def initialize(
 
     # Set the credentials
     if username:
-        logger.debug(f'Setting username to "{username}"')
+        logger.debug('Setting username to "%s"', username)
         configuration['default_credentials']['username'] = username
     if password:
         logger.debug('Setting password')
@@ -47,5 +47,5 @@ def initialize(
 
     # Set the threads (if set)
     if max_threads:
-        logger.debug(f'Setting max_threads to {max_threads}')
+        logger.debug('Setting max_threads to %s', max_threads)
         configuration['threading']['max_threads'] = max_threads
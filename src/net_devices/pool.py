@@ -0,0 +1,268 @@
+"""
+    Module containing the `ConnectionPool` class. Keeps connected Genie
+    devices alive between TestBed instances so they can be reused
+    without a new SSH handshake.
+"""
+
+import atexit
+from collections import deque
+from dataclasses import dataclass, field
+import logging
+import threading
+import time
+from typing import Any, Deque, Dict, Optional, Set, Tuple
+
+
+# Type for the keys in the pool: (hostname, port, username, os)
+PoolKey = Tuple[str, int, Optional[str], str]
+
+
+@dataclass
+class PooledConnection:
+    """
+        Dataclass for connections in the pool
+
+        Members
+        -------
+        handle : Any
+            The connected Genie device
+
+        created : float
+            The `time.monotonic()` timestamp of the moment the
+            connection was first given to the pool
+
+        last_used : float [default=time.monotonic()]
+            The `time.monotonic()` timestamp of the moment the
+            connection was last returned to the pool
+    """
+
+    handle: Any
+    created: float
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class ConnectionPool:
+    """ The ConnectionPool keeps connected Genie devices, keyed by
+        hostname, port, username and OS. Connections that are idle for
+        too long or that are too old are disconnected by a background
+        thread. """
+
+    def __init__(self) -> None:
+        """
+            The initiator creates a empty pool.
+
+            Returns
+            -------
+            None
+        """
+
+        # Create a logger
+        self.logger = logging.getLogger('ConnectionPool')
+
+        # Create the pool and the lock to protect it
+        self.connections: Dict[PoolKey, Deque[PooledConnection]] = dict()
+        self.lock = threading.Lock()
+
+        # The ids of the devices in the pool, to find out quickly if a
+        # device is already in the pool
+        self.pooled_handles: Set[int] = set()
+
+        # The thread that removes expired connections
+        self.reaper: Optional[threading.Thread] = None
+
+    @staticmethod
+    def settings() -> Dict:
+        """ Method that returns the configuration for the pool """
+
+        # We import the configuration here to prevent a circular import
+        from net_devices import configuration
+        return configuration['connection_pool']
+
+    def expired(self, connection: PooledConnection, now: float) -> bool:
+        """
+            Method to check if a connection should be removed from the
+            pool.
+
+            Parameters
+            ----------
+            connection : PooledConnection
+                The connection to check
+
+            now : float
+                The current `time.monotonic()` timestamp
+
+            Returns
+            -------
+            bool:
+                True if the connection is idle for too long or too old
+        """
+        settings = self.settings()
+        return (now - connection.last_used > settings['idle_timeout'] or
+                now - connection.created > settings['max_age'])
+
+    def close(self, handle: Any) -> None:
+        """
+            Method to disconnect a connection that is removed from the
+            pool.
+
+            Parameters
+            ----------
+            handle : Any
+                The Genie device to disconnect
+
+            Returns
+            -------
+            None
+        """
+        self.logger.info('Disconnecting pooled connection to %s', handle.name)
+        try:
+            handle.disconnect()
+        except Exception:
+            pass
+
+    def acquire(self, key: PoolKey) -> Optional[PooledConnection]:
+        """
+            Method to get a connected device from the pool.
+
+            Parameters
+            ----------
+            key : PoolKey
+                The key for the device: (hostname, port, username, os)
+
+            Returns
+            -------
+            Optional[PooledConnection]:
+                A connection with a connected Genie device, or None if
+                there is no usable connection in the pool. Should be
+                given back with `release` when it is not needed anymore.
+        """
+
+        expired = list()
+        acquired = None
+        now = time.monotonic()
+
+        with self.lock:
+            connections = self.connections.get(key, deque())
+            while connections:
+                connection = connections.pop()
+                self.pooled_handles.discard(id(connection.handle))
+                if (self.expired(connection, now) or
+                        not connection.handle.is_connected()):
+                    expired.append(connection.handle)
+                    continue
+                acquired = connection
+                break
+
+        # Disconnect the expired connections outside of the lock
+        for expired_handle in expired:
+            self.close(expired_handle)
+
+        return acquired
+
+    def release(self, key: PoolKey, connection: PooledConnection) -> None:
+        """
+            Method to return a device to the pool. Devices that are
+            not connected, too old or that don't fit in the pool are
+            disconnected.
+
+            Parameters
+            ----------
+            key : PoolKey
+                The key for the device: (hostname, port, username, os)
+
+            connection : PooledConnection
+                The connection to return. Use a new PooledConnection for
+                devices that didn't come from the pool.
+
+            Returns
+            -------
+            None
+        """
+
+        handle = connection.handle
+        now = time.monotonic()
+        connection.last_used = now
+
+        with self.lock:
+            # A device that is already in the pool should never be
+            # handed out twice, so we don't add it again
+            if id(handle) in self.pooled_handles:
+                self.logger.warning(
+                    'Not returning %s; it is already in the pool',
+                    handle.name)
+                return
+
+            connections = self.connections.setdefault(key, deque())
+            keep = (handle.is_connected() and
+                    not self.expired(connection, now) and
+                    len(connections) < self.settings()['max_size'])
+            if keep:
+                connections.append(connection)
+                self.pooled_handles.add(id(handle))
+                self.start_reaper()
+
+        if not keep:
+            self.close(handle)
+
+    def reap(self) -> None:
+        """ Method to disconnect and remove all expired connections """
+
+        expired = list()
+        now = time.monotonic()
+
+        with self.lock:
+            for key, connections in list(self.connections.items()):
+                keep = deque()
+                for connection in connections:
+                    if self.expired(connection, now):
+                        expired.append(connection.handle)
+                        self.pooled_handles.discard(id(connection.handle))
+                    else:
+                        keep.append(connection)
+                if keep:
+                    self.connections[key] = keep
+                else:
+                    del self.connections[key]
+
+        for handle in expired:
+            self.close(handle)
+
+    def close_all(self) -> None:
+        """ Method to disconnect and remove all connections in the
+            pool. Runs when the interpreter exits, so the devices are
+            logged out """
+
+        with self.lock:
+            handles = [
+                connection.handle
+                for connections in self.connections.values()
+                for connection in connections
+            ]
+            self.connections = dict()
+            self.pooled_handles = set()
+
+        for handle in handles:
+            self.close(handle)
+
+    def start_reaper(self) -> None:
+        """ Method to start the background thread that removes expired
+            connections. Should be called with the lock held. """
+
+        if self.reaper is not None and self.reaper.is_alive():
+            return
+
+        def run() -> None:
+            while True:
+                time.sleep(self.settings()['reap_interval'])
+                self.reap()
+
+        self.reaper = threading.Thread(
+            target=run, name='ConnectionPoolReaper', daemon=True)
+        self.reaper.start()
+
+
+# The pool that is shared between all TestBed objects
+connection_pool = ConnectionPool()
+
+# Log out of the pooled devices when the interpreter exits
+atexit.register(connection_pool.close_all)
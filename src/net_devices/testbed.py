@@ -2,19 +2,22 @@
     Module containing the TestBed class.
 """
 
-from dataclasses import dataclass
 from types import TracebackType
-from typing import Dict, List, Optional, Type, Union
-from genie.testbed import load
-import unicon.core.errors
+from typing import (Any, Dict, Iterable, List, Optional, Tuple, Type,
+                    Union, TYPE_CHECKING)
 from net_devices import configuration
 from enum import Enum
+import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from unicon.core.errors import ConnectionError, SubCommandFailure
-from genie.libs.parser.utils.common import ParserNotFound
-from genie.metaparser.util.exceptions import SchemaEmptyParserError
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from net_devices import Command
+from net_devices.pool import connection_pool, PoolKey, PooledConnection
+
+if TYPE_CHECKING:
+    from pyats.topology import Testbed
 
 
 class DeviceType(Enum):
@@ -38,10 +41,10 @@ class DeviceType(Enum):
     CISCO_NX_OS = 'nxos'
 
 
-@dataclass
 class Device:
     """
-        Dataclass for devices
+        Class for devices. Uses `__slots__` instead of a `__dict__` to
+        keep large lists of devices small.
 
         Members
         -------
@@ -52,8 +55,25 @@ class Device:
             The type of device:
     """
 
-    hostname: str
-    device_type: DeviceType = DeviceType.CISCO_IOS
+    __slots__ = ('hostname', 'device_type')
+
+    def __init__(
+        self,
+        hostname: str,
+        device_type: DeviceType = DeviceType.CISCO_IOS
+    ) -> None:
+        self.hostname = hostname
+        self.device_type = device_type
+
+    def __repr__(self) -> str:
+        return (f'Device(hostname={self.hostname!r}, ' +
+                f'device_type={self.device_type!r})')
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return ((self.hostname, self.device_type) ==
+                (other.hostname, other.device_type))
 
 
 class TestBed:
@@ -108,11 +128,22 @@ class TestBed:
         self.log_output = log_output
         self.use_testbed = use_testbed
 
+        # Semaphore to limit the number of connections that are set up
+        # at the same time. SSH servers drop new connections if too
+        # many are unauthenticated at once
+        self.connect_semaphore = threading.BoundedSemaphore(
+            configuration['threading']['max_connects'])
+
         # Create a empty list of devices
         self.devices: List[Device] = list()
 
-        # Create empty testbed
-        self.testbed = None
+        # The connections that are taken from the connection pool, by
+        # hostname
+        self.pooled: Dict[str, PooledConnection] = dict()
+
+        # Create empty testbed. The Genie testbed itself is created
+        # by the `testbed` property
+        self._testbed: Optional['Testbed'] = None
         self.testbed_devices: Dict = {'devices': dict()}
 
         # Add the devices
@@ -136,25 +167,189 @@ class TestBed:
             None
         """
 
-        # Check the type of 'devices' that is given and do the
-        # appropiate action
-        if type(devices) is str:
-            self.add_devices(Device(hostname=devices))
-        elif type(devices) is Device:
-            self.logger.info(f'Adding device "{devices.hostname}"')
-            self.devices.append(devices)
-        elif type(devices) is list:
-            for device in devices:
-                self.add_devices(device)
+        # Create a list of Device-objects from 'devices' in a single
+        # pass. Nested lists are flattened using a stack instead of
+        # recursion; elements of unsupported types are skipped
+        added = list()
+        skipped = 0
+        pending = [devices]
+        while pending:
+            device = pending.pop()
+            if isinstance(device, str):
+                added.append(Device(hostname=device))
+            elif isinstance(device, Device):
+                added.append(device)
+            elif isinstance(device, (list, tuple)):
+                pending.extend(reversed(device))
+            elif device is not None:
+                skipped += 1
+
+        if skipped:
+            self.logger.warning(
+                'Skipping %d devices with an unsupported type', skipped)
+
+        self.logger.info('Adding %d devices', len(added))
+        self.devices.extend(added)
+
+        # If the Genie testbed is already loaded, the new devices have
+        # to be added to it as well
+        if self._testbed is not None:
+            self.load_devices(self._testbed, self.create_cisco_testbed(added))
+
+    @property
+    def testbed(self) -> 'Testbed':
+        """ The Genie testbed. Is loaded the first time it is used """
+
+        if self._testbed is not None:
+            return self._testbed
+
+        # We import Genie here so the package can be imported without
+        # loading the complete pyATS stack
+        from genie.testbed import load
+
+        # Create the Cisco TestBeds and load the devices
+        self.create_cisco_testbed()
+        testbed = load(self.testbed_devices)
+        self.use_pooled_connections(testbed, self.testbed_devices['devices'])
+
+        self._testbed = testbed
+        return testbed
+
+    def load_devices(self, testbed: 'Testbed', devices: Dict) -> None:
+        """
+            Method to add devices to a Genie testbed that is already
+            loaded.
+
+            Parameters
+            ----------
+            testbed : Testbed
+                The loaded Genie testbed
+
+            devices : Dict
+                The devices to add, in the format of the 'devices' in
+                `self.testbed_devices`
+
+            Returns
+            -------
+            None
+        """
+        from genie.testbed import load
+
+        if not devices:
+            return
+
+        loaded = load({'devices': devices})
+        for device in list(loaded.devices.values()):
+            self.move_device(testbed, device)
+        self.use_pooled_connections(testbed, devices)
+
+    @staticmethod
+    def move_device(testbed: 'Testbed', device: Any) -> None:
+        """
+            Method to add a Genie device to a testbed. The device is
+            removed from the testbed it is in, and a device with the
+            same name in the new testbed is replaced, so the device
+            belongs to the new testbed only.
+
+            Parameters
+            ----------
+            testbed : Testbed
+                The Genie testbed to add the device to
+
+            device : Any
+                The Genie device to add
+
+            Returns
+            -------
+            None
+        """
+        current = testbed.devices.get(device.name)
+        if current is not None:
+            testbed.remove_device(current)
+
+        previous = device.testbed
+        if previous is not None and device.name in previous.devices:
+            previous.remove_device(device)
+
+        testbed.add_device(device)
+
+    def use_pooled_connections(
+        self,
+        testbed: 'Testbed',
+        hostnames: Iterable[str]
+    ) -> None:
+        """
+            Method to replace devices in a Genie testbed with connected
+            devices from the connection pool, if there are any. The
+            pooled devices are moved to the testbed, so they don't
+            belong to the testbed of an earlier TestBed anymore.
+
+            Parameters
+            ----------
+            testbed : Testbed
+                The loaded Genie testbed
+
+            hostnames : Iterable[str]
+                The hostnames of the devices to replace
+
+            Returns
+            -------
+            None
+        """
+        if not configuration['connection_pool']['enabled']:
+            return
+
+        for hostname in hostnames:
+            connection = connection_pool.acquire(self.pool_key(hostname))
+            if connection is not None:
+                self.logger.info('Reusing pooled connection to %s', hostname)
+                self.pooled[hostname] = connection
+                self.move_device(testbed, connection.handle)
+
+    def load_testbed(self) -> 'Testbed':
+        """ Method that loads the testbed-object """
+        return self.testbed
 
-    def load_testbed(self):
-        """ Method that loaded the testbed-object """
-        if self.testbed is None:
-            # Create the Cisco TestBeds
-            self.create_cisco_testbed()
+    def pool_key(self, hostname: str) -> PoolKey:
+        """
+            Method to get the key for a device in the connection pool.
 
-            # Load the devices
-            self.testbed = load(self.testbed_devices)
+            Parameters
+            ----------
+            hostname : str
+                The hostname of the device to get the key for
+
+            Returns
+            -------
+            PoolKey:
+                The key for the device: (hostname, port, username, os)
+        """
+        testbed_device = self.testbed_devices['devices'][hostname]
+        connection = testbed_device['connections']['cli']
+        return (
+            connection['ip'],
+            connection['port'],
+            testbed_device['credentials']['default']['username'],
+            testbed_device['os']
+        )
+
+    def release_devices(self) -> None:
+        """ Method to return the devices to the connection pool """
+        self.logger.info('Returning all devices to the connection pool')
+
+        # Every Genie device is returned once, even if it is in the
+        # testbed more than once
+        released = set()
+        for hostname, handle in self.testbed.devices.items():
+            if id(handle) in released:
+                continue
+            released.add(id(handle))
+
+            connection = self.pooled.pop(hostname, None)
+            if connection is None or connection.handle is not handle:
+                connection = PooledConnection(
+                    handle=handle, created=time.monotonic())
+            connection_pool.release(self.pool_key(hostname), connection)
 
     def connect_device(self, device) -> None:
         """
@@ -169,14 +364,21 @@ class TestBed:
             -------
             None
         """
-        self.logger.info(f'Connecting to {device.name}')
+        from unicon.core.errors import ConnectionError
+
+        if device.is_connected():
+            self.logger.info('Already connected to %s', device.name)
+            return
+
+        self.logger.info('Connecting to %s', device.name)
         try:
-            device.connect(
-                init_exec_commands=[],
-                init_config_commands=[],
-                log_stdout=self.log_output)
+            with self.connect_semaphore:
+                device.connect(
+                    init_exec_commands=[],
+                    init_config_commands=[],
+                    log_stdout=self.log_output)
         except ConnectionError:
-            self.logger.error(f'Couldn\'t connect to device {device.name}')
+            self.logger.error('Couldn\'t connect to device %s', device.name)
 
     def disconnect_device(self, device) -> None:
         """
@@ -191,13 +393,58 @@ class TestBed:
             -------
             None
         """
-        self.logger.info(f'Disconnecting from {device.name}')
+        self.logger.info('Disconnecting from %s', device.name)
         try:
-            device.execute('exit')
-        except SubCommandFailure:
-            pass
+            device.disconnect()
+        except Exception:
+            self.logger.error('Couldn\'t disconnect from %s', device.name)
+
+    @staticmethod
+    def max_workers(count: int) -> int:
+        """
+            Method to get the number of threads to use for a number of
+            devices.
+
+            Parameters
+            ----------
+            count : int
+                The number of devices to run the action for
+
+            Returns
+            -------
+            int:
+                The number of threads; never more than the configured
+                maximum and never more than the number of devices
+        """
+        return min(count or 1, configuration['threading']['max_threads'])
+
+    @staticmethod
+    def results_to_dict(
+        results: Iterable[Optional[Tuple[str, Any]]]
+    ) -> Dict[str, Any]:
+        """
+            Method to create the return dict from the results of the
+            threads.
+
+            Parameters
+            ----------
+            results : Iterable[Optional[Tuple[str, Any]]]
+                The results; a tuple with the name of the device and
+                the parsed output, or None for skipped devices
+
+            Returns
+            -------
+            Dict[str, Any]:
+                The parsed output per device, in the same order as the
+                results
+        """
+        return_dict = OrderedDict()
+        for result in results:
+            if result is not None:
+                return_dict[result[0]] = result[1]
+        return return_dict
 
-    def parse_command(self, arguments: dict) -> None:
+    def parse_command(self, arguments: dict) -> Optional[Tuple[str, dict]]:
         """
             Method to run a parse command on a device
 
@@ -209,35 +456,73 @@ class TestBed:
                 Should contain the following keys:
                 - 'device': the device object to run it on
                 - 'command': the command to run
-                - 'return_dict': a dict where we can place the return
-                   values
 
             Returns
             -------
-            None
+            Optional[Tuple[str, dict]]:
+                The name of the device and the parsed output, or None
+                if the device is not connected
         """
 
         try:
             device = arguments['device']
             command = arguments['command']
-            return_dict = arguments['return_dict']
         except KeyError:
             return None
 
         self.logger.info(
-            f'Running the command "{command}" on ' +
-            f'device "{device.name}"')
+            'Running the command "%s" on device "%s"', command, device.name)
 
         if device.is_connected():
             try:
-                return_dict[device.name] = device.parse(command)
+                return device.name, device.parse(command)
             except Exception as e:
-                return_dict[device.name] = {
+                return device.name, {
                     'error': str(e)
                 }
         else:
             self.logger.warning(
-                f'Skipping device "{device}" because it is not connected')
+                'Skipping device "%s" because it is not connected', device)
+            return None
+
+    def parse_arguments(self, command: Union[str, Command]) -> List[dict]:
+        """
+            Method to create the arguments for `parse_command` for
+            every device.
+
+            Parameters
+            ----------
+            command : Union[str, Command]
+                The command to send. Can be a string of a Command
+                object in case you want to use different commands
+                per platform.
+
+            Returns
+            -------
+            List[dict]:
+                The arguments for `parse_command` for every device
+        """
+
+        # If we got a string, we have to transform it to a Command
+        # object
+        if type(command) is str:
+            command = Command(command=command)
+
+        # Look up the command for every OS type once, so we can find
+        # the command for a device with a single dict lookup
+        commands = {os: command.get(os) for os in Command.attributes}
+
+        # Generate the arguments in one pass over the devices
+        devices = [
+            {
+                'device': obj,
+                'command': commands[obj.os]
+            }
+            for device, obj in self.testbed.devices.items()
+            if obj.os in commands and commands[obj.os] != ''
+        ]
+
+        return devices
 
     def parse(
         self,
@@ -285,46 +570,155 @@ class TestBed:
             self.logger.info(
                 'Sending a parsing-command to all devices one by one')
 
-            # Empty return dict
-            return_dict = dict()
+            # Generate the arguments
+            devices = self.parse_arguments(command)
 
-            # If we got a string, we have to transform it to a Command
-            # object
-            if type(command) is str:
-                command = Command(command=command)
+            # Start the threads
+            with ThreadPoolExecutor(
+                    max_workers=self.max_workers(len(devices))) as executor:
+                futures = [
+                    executor.submit(self.parse_command, arguments)
+                    for arguments in devices
+                ]
+                wait(futures)
 
-            # Update the commands in the Command object
-            command.set_commands()
+            self.logger.info('Done with running the parse commands')
 
-            # Empty list of devices
-            devices = list()
+            # Calling `result()` raises the exceptions from the threads
+            return self.results_to_dict(
+                future.result() for future in futures)
 
-            # Generate the arguments
-            command_families = {
-                'ios': 'command_ios',
-                'iosxr': 'command_ios_xr',
-                'iosxe': 'command_ios_xe',
-                'nxos': 'command_nx_os'
-            }
+    def parse_commands(
+        self,
+        arguments: dict
+    ) -> Optional[Tuple[str, Dict[str, dict]]]:
+        """
+            Method to run multiple parse commands on a device, one
+            after another in the same session
 
-            for os, attribute in command_families.items():
-                devices += [
-                    {
-                        'device': obj,
-                        'command': getattr(command, attribute),
-                        'return_dict': return_dict
-                    }
-                    for device, obj in self.testbed.devices.items()
-                    if obj.os == os and getattr(command, attribute) != ''
-                ]
+            Parameters
+            ----------
+            arguments
+                The arguments given to the method. Is done by a dict
+                because that is the way the ThreadPoolExecutor works.
+                Should contain the following keys:
+                - 'device': the device object to run it on
+                - 'commands': the list of commands to run
 
-            # Start the threads
-            with ThreadPoolExecutor(max_workers=configuration['threading']['max_threads']) as executor:
-                executor.map(self.parse_command, devices)
+            Returns
+            -------
+            Optional[Tuple[str, Dict[str, dict]]]:
+                The name of the device and the parsed output for every
+                command, or None if the device is not connected
+        """
 
-            self.logger.info('Done with running the parse commands')
+        try:
+            device = arguments['device']
+            commands = arguments['commands']
+        except KeyError:
+            return None
+
+        results = OrderedDict()
+        for command in commands:
+            result = self.parse_command(
+                {'device': device, 'command': command})
+            if result is None:
+                return None
+            results[command] = result[1]
+
+        return device.name, results
+
+    def parse_many(
+        self,
+        commands: List[Union[str, Command]]
+    ) -> Dict[str, Dict[str, dict]]:
+        """
+            Method to run multiple parsed commands. All commands for a
+            device are run by the same thread, so every device only
+            needs one task for the complete list of commands.
+
+            Parameters
+            ----------
+            commands : List[Union[str, Command]]
+                The commands to send. Every command can be a string or
+                a Command object in case you want to use different
+                commands per platform.
+
+            Returns
+            -------
+            Dict[str, Dict[str, dict]]:
+                The dict that contains the parsed commands per device.
+                For every device, the parsed output is placed under the
+                command that was sent to that device. Commands that
+                are the same for a device are sent only once.
+        """
+        self.logger.info(
+            'Sending %d parsing-commands to all devices one by one',
+            len(commands))
+
+        # Look up the commands for every OS type once
+        commands = [
+            Command(command=command) if type(command) is str else command
+            for command in commands
+        ]
+        tables = [
+            {os: command.get(os) for os in Command.attributes}
+            for command in commands
+        ]
+
+        # Generate the arguments; one item for every device
+        devices = list()
+        for device, obj in self.testbed.devices.items():
+            if obj.os not in Command.attributes:
+                continue
+            # Commands that are empty for this type of device are
+            # skipped, and a command that is given more than once is
+            # only run once
+            os_commands = list(dict.fromkeys(
+                table[obj.os] for table in tables if table[obj.os]))
+            if os_commands:
+                devices.append({'device': obj, 'commands': os_commands})
+
+        # Start the threads
+        with ThreadPoolExecutor(
+                max_workers=self.max_workers(len(devices))) as executor:
+            futures = [
+                executor.submit(self.parse_commands, arguments)
+                for arguments in devices
+            ]
+            wait(futures)
+
+        self.logger.info('Done with running the parse commands')
+
+        # Calling `result()` raises the exceptions from the threads
+        return self.results_to_dict(future.result() for future in futures)
+
+    async def parse_async(self, command: Union[str, Command]) -> dict:
+        """
+            Coroutine to run a parsed command on all devices one by
+            one. Runs `parse` in the default executor of the event
+            loop, so the event loop is not blocked.
+
+            Parameters
+            ----------
+            command : Union[str, Command]
+                The command to send. Can be a string of a Command
+                object in case you want to use different commands
+                per platform.
 
-            return return_dict
+            Returns
+            -------
+            dict:
+                The dict that contains the parsed commands
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.parse, command)
+
+    async def connect_async(self) -> None:
+        """ Coroutine to connect to all devices one by one. Runs
+            `connect` in the default executor of the event loop, so
+            the event loop is not blocked. """
+        await asyncio.get_running_loop().run_in_executor(None, self.connect)
 
     def connect(self, use_testbed: Optional[bool] = None) -> None:
         """
@@ -366,7 +760,8 @@ class TestBed:
             self.logger.info('Connecting to all devices one by one')
             devices = [obj for device, obj in self.testbed.devices.items()]
 
-            with ThreadPoolExecutor(max_workers=configuration['threading']['max_threads']) as executor:
+            with ThreadPoolExecutor(
+                    max_workers=self.max_workers(len(devices))) as executor:
                 executor.map(self.connect_device, devices)
 
     def disconnect(self, use_testbed: Optional[bool] = None) -> None:
@@ -396,13 +791,17 @@ class TestBed:
             # Connect using the Cisco TestBed
             self.logger.info(
                 'Disconnecting from all devices using the Cisco TestBed')
-            self.testbed.disconnect()
+            try:
+                self.testbed.disconnect()
+            except Exception:
+                self.logger.error('Couldn\'t disconnect from all devices')
         else:
             # Disconnect device one by one
             self.logger.info('Disconnecting to all devices one by one')
             devices = [obj for device, obj in self.testbed.devices.items()]
 
-            with ThreadPoolExecutor(max_workers=configuration['threading']['max_threads']) as executor:
+            with ThreadPoolExecutor(
+                    max_workers=self.max_workers(len(devices))) as executor:
                 executor.map(self.disconnect_device, devices)
 
     def __enter__(self):
@@ -424,24 +823,80 @@ class TestBed:
                  traceback: Optional[TracebackType]) -> bool:
         """ Context manager is done! """
 
-        # Disconnect from the devices
-        self.disconnect()
+        # Return the devices to the connection pool, or disconnect
+        # from them if the pool is disabled
+        if configuration['connection_pool']['enabled']:
+            self.release_devices()
+        else:
+            self.disconnect()
 
         # If 'type' is None, there was no error so we can return True.
         # Otherwise, False is returned and the exception is passed
         # through
         return exception_type is None
 
-    def create_cisco_testbed(self) -> None:
-        """ Method to create the Cisco TestBed """
+    def create_cisco_testbed(
+        self,
+        devices: Optional[List[Device]] = None
+    ) -> Dict:
+        """
+            Method to create the Cisco TestBed. Adds the devices that
+            are not in `self.testbed_devices` yet.
+
+            Parameters
+            ----------
+            devices : Optional[List[Device]] [default=None]
+                The devices to add. By default, all devices of the
+                object are used.
+
+            Returns
+            -------
+            Dict:
+                The devices that are added, in the same format as the
+                'devices' in `self.testbed_devices`
+        """
 
-        # Add all devices to the list for the Genie Testbed
-        for device in self.devices:
-            self.testbed_devices['devices'][device.hostname] = {
-                'ip': device.hostname,
-                'port': 22,
-                'protocol': 'ssh',
+        if devices is None:
+            devices = self.devices
+
+        # Get the credentials once, instead of for every device
+        credentials = {
+            'default': {
                 'username': configuration['default_credentials']['username'],
-                'password': configuration['default_credentials']['password'],
-                'os': device.device_type.value
+                'password': configuration['default_credentials']['password']
             }
+        }
+
+        # Let the devices share one SSH connection per host, so only
+        # the first session does the SSH handshake and authentication
+        ssh = configuration['ssh']
+        ssh_options = ''
+        if ssh['multiplex']:
+            ssh_options = (
+                '-o ControlMaster=auto ' +
+                f'-o ControlPath={ssh["control_path"]} ' +
+                f'-o ControlPersist={ssh["control_persist"]}')
+
+        # Create the devices that are not yet in the list for the Genie
+        # Testbed
+        testbed_devices = self.testbed_devices['devices']
+        added = {
+            device.hostname: {
+                'os': device.device_type.value,
+                'type': device.device_type.value,
+                'credentials': credentials,
+                'connections': {
+                    'cli': {
+                        'protocol': 'ssh',
+                        'ip': device.hostname,
+                        'port': 22,
+                        'ssh_options': ssh_options
+                    }
+                }
+            }
+            for device in devices
+            if device.hostname not in testbed_devices
+        }
+        testbed_devices.update(added)
+
+        return added
@@ -13,6 +13,7 @@ setup(
     license='GNU GPLv3',
     zip_safe=False,
     packages=['net_devices'],
+    python_requires='>=3.7',
     install_requires=[
         'genie==21.7',
         'pyats==21.7'
@@ -0,0 +1,107 @@
+"""
+    Fixtures for the tests. Genie and unicon are replaced by fake
+    modules, so the tests don't need devices or the pyATS stack.
+"""
+
+import sys
+import types
+import pytest
+from net_devices import configuration
+from net_devices.pool import connection_pool
+
+
+class FakeGenieDevice:
+    """ Fake Genie device that keeps track of its connection and of the
+        commands that are parsed """
+
+    def __init__(self, name: str, os: str) -> None:
+        self.name = name
+        self.os = os
+        self.testbed = None
+        self.connected = False
+        self.disconnects = 0
+        self.parsed = list()
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def connect(self, **kwargs) -> None:
+        self.connected = True
+
+    def disconnect(self) -> None:
+        self.connected = False
+        self.disconnects += 1
+
+    def parse(self, command: str) -> dict:
+        self.parsed.append(command)
+        return {'command': command, 'device': self.name}
+
+
+class FakeGenieTestbed:
+    """ Fake Genie testbed """
+
+    def __init__(self) -> None:
+        self.devices = dict()
+
+    def add_device(self, device: FakeGenieDevice) -> None:
+        if device.name in self.devices:
+            raise ValueError(f'Duplicate device {device.name}')
+        device.testbed = self
+        self.devices[device.name] = device
+
+    def remove_device(self, device: FakeGenieDevice) -> None:
+        del self.devices[device.name]
+        device.testbed = None
+
+    def disconnect(self) -> None:
+        for device in self.devices.values():
+            device.disconnect()
+
+
+def fake_load(testbed: dict) -> FakeGenieTestbed:
+    """ Fake for `genie.testbed.load` """
+    loaded = FakeGenieTestbed()
+    for name, device in testbed['devices'].items():
+        loaded.add_device(FakeGenieDevice(name, device['os']))
+    return loaded
+
+
+@pytest.fixture
+def settings():
+    """ Fixture for the pool configuration. Is restored afterwards and
+        uses a long reap interval so the reaper doesn't interfere """
+    original = dict(configuration['connection_pool'])
+    configuration['connection_pool'].update({
+        'enabled': True,
+        'max_size': 2,
+        'idle_timeout': 300,
+        'max_age': 3600,
+        'reap_interval': 3600
+    })
+    yield configuration['connection_pool']
+    configuration['connection_pool'].clear()
+    configuration['connection_pool'].update(original)
+
+
+@pytest.fixture
+def genie(monkeypatch, settings):
+    """ Fixture that installs the fake Genie and unicon modules and
+        empties the shared connection pool afterwards """
+    errors = types.ModuleType('unicon.core.errors')
+    errors.ConnectionError = ConnectionError
+    errors.SubCommandFailure = Exception
+    testbed = types.ModuleType('genie.testbed')
+    testbed.load = fake_load
+
+    modules = {
+        'genie': types.ModuleType('genie'),
+        'genie.testbed': testbed,
+        'unicon': types.ModuleType('unicon'),
+        'unicon.core': types.ModuleType('unicon.core'),
+        'unicon.core.errors': errors
+    }
+    for name, module in modules.items():
+        monkeypatch.setitem(sys.modules, name, module)
+
+    yield
+    connection_pool.close_all()
@@ -0,0 +1,147 @@
+"""
+    Tests for the `ConnectionPool` class.
+"""
+
+import time
+import pytest
+from net_devices.pool import ConnectionPool, PooledConnection
+
+
+KEY = ('router', 22, 'user', 'ios')
+
+
+class FakeDevice:
+    """ Fake Genie device that keeps track of its connection """
+
+    def __init__(self, name: str = 'router') -> None:
+        self.name = name
+        self.connected = True
+        self.disconnects = 0
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def disconnect(self) -> None:
+        self.connected = False
+        self.disconnects += 1
+
+
+@pytest.fixture
+def pool(settings):
+    """ Fixture for a empty pool """
+    return ConnectionPool()
+
+
+def new_connection(device: FakeDevice) -> PooledConnection:
+    """ Create a connection for a device that is not pooled yet """
+    return PooledConnection(handle=device, created=time.monotonic())
+
+
+def test_acquire_empty_pool(pool):
+    assert pool.acquire(KEY) is None
+
+
+def test_release_and_acquire(pool):
+    device = FakeDevice()
+    pool.release(KEY, new_connection(device))
+
+    connection = pool.acquire(KEY)
+    assert connection.handle is device
+    assert device.disconnects == 0
+    assert pool.acquire(KEY) is None
+
+
+def test_acquire_other_key(pool):
+    pool.release(KEY, new_connection(FakeDevice()))
+    assert pool.acquire(('router', 22, 'other', 'ios')) is None
+
+
+def test_acquire_keeps_created(pool):
+    connection = PooledConnection(
+        handle=FakeDevice(), created=time.monotonic() - 10)
+    pool.release(KEY, connection)
+    assert pool.acquire(KEY).created == connection.created
+
+
+def test_release_twice(pool):
+    device = FakeDevice()
+    pool.release(KEY, new_connection(device))
+    pool.release(KEY, new_connection(device))
+
+    assert pool.acquire(KEY).handle is device
+    assert pool.acquire(KEY) is None
+    assert device.disconnects == 0
+
+
+def test_release_disconnected(pool):
+    device = FakeDevice()
+    device.connected = False
+    pool.release(KEY, new_connection(device))
+    assert pool.acquire(KEY) is None
+
+
+def test_release_max_size(pool):
+    devices = [FakeDevice() for _ in range(3)]
+    for device in devices:
+        pool.release(KEY, new_connection(device))
+
+    assert [device.disconnects for device in devices] == [0, 0, 1]
+
+
+def test_release_too_old(pool, settings):
+    device = FakeDevice()
+    pool.release(KEY, PooledConnection(
+        handle=device, created=time.monotonic() - settings['max_age'] - 1))
+
+    assert device.disconnects == 1
+    assert pool.acquire(KEY) is None
+
+
+def test_acquire_idle(pool, settings):
+    device = FakeDevice()
+    pool.release(KEY, new_connection(device))
+    pool.connections[KEY][0].last_used -= settings['idle_timeout'] + 1
+
+    assert pool.acquire(KEY) is None
+    assert device.disconnects == 1
+
+
+def test_acquire_not_connected(pool):
+    device = FakeDevice()
+    pool.release(KEY, new_connection(device))
+    device.connected = False
+    assert pool.acquire(KEY) is None
+
+
+def test_reap(pool, settings):
+    idle = FakeDevice()
+    fresh = FakeDevice()
+    pool.release(KEY, new_connection(idle))
+    pool.release(KEY, new_connection(fresh))
+    pool.connections[KEY][0].last_used -= settings['idle_timeout'] + 1
+
+    pool.reap()
+
+    assert idle.disconnects == 1
+    assert fresh.disconnects == 0
+    assert pool.acquire(KEY).handle is fresh
+
+
+def test_reap_removes_empty_keys(pool, settings):
+    pool.release(KEY, new_connection(FakeDevice()))
+    pool.connections[KEY][0].last_used -= settings['idle_timeout'] + 1
+
+    pool.reap()
+
+    assert KEY not in pool.connections
+
+
+def test_close_all(pool):
+    devices = [FakeDevice(), FakeDevice()]
+    for device in devices:
+        pool.release(KEY, new_connection(device))
+
+    pool.close_all()
+
+    assert [device.disconnects for device in devices] == [1, 1]
+    assert pool.acquire(KEY) is None
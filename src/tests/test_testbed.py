@@ -0,0 +1,135 @@
+"""
+    Tests for the `TestBed` class.
+"""
+
+import pytest
+from net_devices import Command
+from net_devices.pool import connection_pool
+from net_devices.testbed import Device, DeviceType
+
+# Imported under a different name, so pytest doesn't try to collect it
+from net_devices.testbed import TestBed as NetTestBed
+
+
+def test_parse_many_per_os(genie):
+    testbed = NetTestBed([
+        Device('A'),
+        Device('X', device_type=DeviceType.CISCO_IOS_XR)
+    ])
+    testbed.connect()
+
+    results = testbed.parse_many([
+        'show version',
+        Command(command_ios='show ip route', command_ios_xr='show route ipv4')
+    ])
+
+    assert list(results) == ['A', 'X']
+    assert list(results['A']) == ['show version', 'show ip route']
+    assert list(results['X']) == ['show version', 'show route ipv4']
+    assert results['X']['show route ipv4'] == {
+        'command': 'show route ipv4', 'device': 'X'}
+
+
+def test_parse_many_skips_missing_commands(genie):
+    testbed = NetTestBed('A')
+    testbed.connect()
+
+    results = testbed.parse_many(['show version', Command(command_ios_xr='x')])
+
+    assert list(results['A']) == ['show version']
+
+
+def test_parse_many_dedupes_commands(genie):
+    testbed = NetTestBed('A')
+    testbed.connect()
+
+    results = testbed.parse_many([
+        'show version', Command(command='show version')])
+
+    assert list(results['A']) == ['show version']
+    assert testbed.testbed.devices['A'].parsed == ['show version']
+
+
+def test_parse_many_skips_disconnected_devices(genie):
+    testbed = NetTestBed(['A', 'B'])
+    testbed.testbed.devices['A'].connect()
+
+    results = testbed.parse_many(['show version'])
+
+    assert list(results) == ['A']
+    assert testbed.testbed.devices['B'].parsed == []
+
+
+def test_add_devices_after_load(genie):
+    testbed = NetTestBed('A')
+    testbed.connect()
+
+    testbed.add_devices(['B', 'A'])
+    testbed.connect()
+
+    assert list(testbed.testbed.devices) == ['A', 'B']
+    assert testbed.testbed.devices['B'].testbed is testbed.testbed
+    assert list(testbed.parse('show version')) == ['A', 'B']
+
+
+def test_pool_reuses_devices(genie):
+    with NetTestBed('A') as first:
+        handle = first.testbed.devices['A']
+
+    second = NetTestBed('A')
+    second.connect()
+
+    assert second.testbed.devices['A'] is handle
+    assert handle.testbed is second.testbed
+    assert 'A' not in first.testbed.devices
+    assert handle.disconnects == 0
+
+
+def test_pool_releases_duplicate_devices_once(genie):
+    with NetTestBed(['A', 'A', 'B']):
+        pass
+
+    assert {key[0]: len(connections)
+            for key, connections in connection_pool.connections.items()
+            } == {'A': 1, 'B': 1}
+
+    first = NetTestBed('A')
+    second = NetTestBed('A')
+    first.load_testbed()
+    second.load_testbed()
+
+    assert first.testbed.devices['A'] is not second.testbed.devices['A']
+
+
+def test_pool_keeps_created_time(genie):
+    with NetTestBed('A'):
+        pass
+    created = connection_pool.connections[('A', 22, None, 'ios')][0].created
+
+    with NetTestBed('A') as testbed:
+        assert testbed.pooled['A'].created == created
+
+    assert connection_pool.connections[
+        ('A', 22, None, 'ios')][0].created == created
+
+
+def test_exit_without_pool_disconnects(genie, settings):
+    settings['enabled'] = False
+
+    with NetTestBed(['A', 'B']) as testbed:
+        devices = list(testbed.testbed.devices.values())
+
+    assert [device.disconnects for device in devices] == [1, 1]
+    assert connection_pool.connections == dict()
+
+
+def test_exit_keeps_exception_when_disconnect_fails(genie, settings):
+    settings['enabled'] = False
+
+    def fail() -> None:
+        raise RuntimeError('disconnect failed')
+
+    with pytest.raises(ValueError):
+        with NetTestBed('A') as testbed:
+            testbed.testbed.devices['A'].disconnect = fail
+            raise ValueError('error in the body')